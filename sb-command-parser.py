@@ -1,4 +1,221 @@
-import shlex
+import re
+import sys
+from collections import namedtuple
+from functools import lru_cache
+
+# column names of the returned data structure
+_COL_CMD = sys.intern('Command')
+_COL_TN = sys.intern('Task Name')
+_COL_TD = sys.intern('Task Description')
+_COL_PL = sys.intern('Priority Level')
+_COL_PCT = sys.intern('Percent Completion')
+
+# slackbot command names
+_CMD_CREATE = sys.intern('create')
+_CMD_UPDATE = sys.intern('update')
+_CMD_SUSPEND = sys.intern('suspend')
+_CMD_ABANDON = sys.intern('abandon')
+
+# longest accepted input line: longer lines are rejected before any parsing
+# (generous for a command, the task description being the only free text)
+_MAX_LINE_LENGTH = 2048
+
+# valid priority levels (0:low, 1:medium, 2:high)
+_PRIO = frozenset((0, 1, 2))
+
+# characters separating tokens: the same as shlex, so that other whitespace (e.g. the non-breaking
+# spaces inserted by some Slack clients) is kept inside tokens
+_WHITESPACE = ' \t\r\n'
+
+
+# one token: optional leading whitespace, then unquoted characters and quoted parts, until whitespace
+# (whitespace being the characters of _WHITESPACE)
+_TOKEN_RE = re.compile(r'''[ \t\r\n]*((?:[^ \t\r\n'"]+|'[^']*'|"[^"]*")+)''')
+# one quoted part of a token
+_QUOTED_RE = re.compile(r''''[^']*'|"[^"]*"''')
+# whitespace that str.split() splits on, but that is not in _WHITESPACE
+_OTHER_SPACE_RE = re.compile(r'[^\S \t\r\n]')
+
+
+def _unquote(match):
+    return match.group()[1:-1]
+
+
+def _fast_split(s, max_tokens=3):
+    """ Split a line of text into at most max_tokens whitespace separated tokens.
+    Single and double quotes group characters into a token and are removed, like shlex.split does,
+    but without building a shlex lexer object. Only the first max_tokens tokens are built; the rest of
+    the line is still scanned, so that a quote that is not closed anywhere in the line rejects it.
+    Characters are scanned by precompiled regular expressions, not by a Python loop.
+    An empty list is returned if a quote is not closed.
+    :param s: input line of text.
+    :param max_tokens: maximum number of tokens to return.
+    """
+    tokens = []
+    pos = 0
+    while True:
+        match = _TOKEN_RE.match(s, pos)
+        if match is None:
+            # either only whitespace is left, or a quote is not closed: not a valid line
+            if not s[pos:].strip(_WHITESPACE):
+                break
+            return []
+        pos = match.end()
+        if pos < len(s) and s[pos] in '\'"':
+            # the token stops on a quote that is not closed: not a valid line
+            return []
+        if len(tokens) < max_tokens:
+            token = match.group(1)
+            # quoted parts are copied without their quotes
+            if "'" in token or '"' in token:
+                token = _QUOTED_RE.sub(_unquote, token)
+            tokens.append(token)
+    return tokens
+
+
+def _safe_int(s):
+    """ Convert a string to an integer, return None if the string is not a valid integer.
+    :param s: string to convert.
+    """
+    try:
+        return int(s)
+    except ValueError:
+        return None
+
+
+class Parsed(namedtuple('Parsed', 'command task_name task_description priority_level percent_completion',
+                        defaults=('', '', ''))):
+    """ Immutable, compact record of a slackbot command (also the value kept in the parse cache).
+    Fields that a command does not take are left as empty strings.
+    """
+    __slots__ = ()
+
+    def as_dict(self):
+        """ Return the command as a new dictionary, keyed by column names (see slackbot_command_parse). """
+        return {_COL_CMD: self[0], _COL_TN: self[1], _COL_TD: self[2], _COL_PL: self[3], _COL_PCT: self[4]}
+
+
+def _priority(param):
+    """ Return the priority level (0, 1 or 2) given as a string, or None if it is not valid. """
+    pl = _safe_int(param)
+    return pl if pl in _PRIO else None
+
+
+def _percent(param):
+    """ Return the percent completion (0 to 100) given as a string, or None if it is not valid. """
+    pc = _safe_int(param)
+    return pc if pc is not None and 0 <= pc <= 100 else None
+
+
+# following functions: specific processing for each slackbot command
+# each one takes the parameters of the command (<tn:{td}:{pl}:{pc}>), and returns a Parsed record,
+# or None if a parameter is missing or incorrect
+# parameters: TN task_name, TD task_description, PL priority_level, PC percent_completion
+
+def _parse_create(arg):
+    # exactly 4 parameters (3 separators), and all parameters must be correct
+    # the separators are counted before splitting, so overly long inputs are rejected without allocations
+    if arg.count(':') == 3:
+        tn, td, pl, pc = arg.split(':', 3)
+        if tn and td:
+            pl = _priority(pl)
+            pc = _percent(pc)
+            if pl is not None and pc is not None:
+                return Parsed(_CMD_CREATE, tn, td, pl, pc)
+    return None
+
+
+def _parse_update(arg):
+    # exactly 4 parameters (3 separators), but TD and PL can be empty
+    if arg.count(':') == 3:
+        tn, td, pl, pc = arg.split(':', 3)
+        pc = _percent(pc)
+        # basic parameter value checks: only TN and PC; TD can be added even if empty, no need to check
+        if tn and pc is not None:
+            # check for optional PL; if PL is there, it has to be valid
+            if pl:
+                pl = _priority(pl)
+                if pl is None:
+                    return None
+            return Parsed(_CMD_UPDATE, tn, td, pl, pc)
+    return None
+
+
+def _task_name_parser(cmd):
+    """ Build the parsing function of a command that only takes a task name (suspend, abandon).
+    :param cmd: command name, used in the returned data structure.
+    """
+    def parse(arg):
+        # the task name must not be empty, and must not be followed by other parameters (no ':')
+        if arg and ':' not in arg:
+            return Parsed(cmd, arg)
+        return None
+    return parse
+
+
+# command dispatch table, built once at module load: command name -> parsing function
+_DISPATCH = {_CMD_CREATE: _parse_create,
+             _CMD_UPDATE: _parse_update,
+             _CMD_SUSPEND: _task_name_parser(_CMD_SUSPEND),
+             _CMD_ABANDON: _task_name_parser(_CMD_ABANDON)}
+
+
+@lru_cache(maxsize=1024)
+def _parse(command_text):
+    """ Parse the text following the slackbot keyword, return a Parsed record for a slackbot command, or None.
+    Parsing is a pure function of its argument, so results are cached: identical commands
+    (client retries, re-submitted commands) are not parsed again.
+    """
+
+    # split on whitespace, respecting single and double quotes
+    # most lines have no quotes at all: str.split gives the same tokens, the tokenizer is only needed for quotes,
+    # or for other whitespace than _WHITESPACE (which str.split would split on)
+    # (at most 2 splits: anything after the second token is ignored, as with the tokenizer)
+    if ("'" not in command_text and '"' not in command_text and
+            _OTHER_SPACE_RE.search(command_text) is None):
+        parsed_input = command_text.split(None, 2)
+    else:
+        parsed_input = _fast_split(command_text, 2)
+    # if the text is a slackbot command, then we should have:
+    # parsed_input[0] == <command>             : keywork for the slackbot command
+    # parsed_input[1] == <tn:{td}:{pl}:{pc}>   : parameters of slackbot command
+    if len(parsed_input) < 2:
+        return None
+    cmd = parsed_input[0]
+    arg = parsed_input[1]
+
+    # dispatch to the specific processing of the command: unknown commands are rejected
+    handler = _DISPATCH.get(cmd)
+    if handler is None:
+        return None
+    return handler(arg)
+
+
+def slackbot_command_record(input_line_of_text,begins_with='/slackbot'):
+    """ Evaluate an input line of text, return a Parsed record for a slackbot command, or None.
+    Same syntax and verification as slackbot_command_parse; the record is smaller than the dictionary,
+    and its fields are read as attributes, which suits callers that keep parsed commands around.
+    The record is immutable, and may be shared with other callers.
+    :param input_line_of_text: input line of text.
+    :param begins_with: string that the command is supposed to start with.
+    """
+
+    # bound the work done on overly long (possibly malicious) input, and keep it out of the cache
+    if len(input_line_of_text) > _MAX_LINE_LENGTH:
+        return None
+
+    # check that the line starts with '/slackbot' (slash, 'slackbot'), or the user argument begins_with,
+    # followed by whitespace: most messages are not commands, and are rejected here without tokenizing
+    # (leading whitespace is allowed; the prefix cannot be quoted, nor directly followed by a quote)
+    input_line_of_text = input_line_of_text.lstrip(_WHITESPACE)
+    if not input_line_of_text.startswith(begins_with):
+        return None
+    prefix_length = len(begins_with)
+    if len(input_line_of_text) == prefix_length or input_line_of_text[prefix_length] not in _WHITESPACE:
+        return None
+
+    return _parse(input_line_of_text[prefix_length:])
+
 
 def slackbot_command_parse(input_line_of_text,begins_with='/slackbot'):
     """ Evaluate an input line of text, extract and return a data structure for a slackbot command.
@@ -12,112 +229,18 @@ def slackbot_command_parse(input_line_of_text,begins_with='/slackbot'):
     Values for keys ('Command','Task Name','Task Description') are strings
     Values for keys ('Priority Level','Percent Completion') are integers or empty strings.
     Basic command parameter value verification is performed.
+    If the input is not a valid slackbot command, an empty dictionary is returned.
+    Input lines longer than _MAX_LINE_LENGTH characters are never considered as slackbot commands.
     :param input_line_of_text: input line of text.
     :param begins_with: string that the command is supposed to start with.
     """
 
-    # declare returned data structure
-    ret_dict = {}
-
-    # some local variables
-    priority_level_list = [0,1,2]
-    # column names
-    col_command = 'Command'
-    col_taskname = 'Task Name'
-    col_taskdesc = 'Task Description'
-    col_priolevel = 'Priority Level'
-    col_percent = 'Percent Completion'
-
-    try:
-
-        # use shlex: Shell-like lexical analysis
-        parsed_input = shlex.split(input_line_of_text)
-        # if the input is a slackbot command, then we should have:
-        # parsed_input[0] == '/slackbot'           : keyword for slackbot
-        # parsed_input[1] == <command>             : keywork for the slackbot command
-        # parsed_input[2] == <tn:{td}:{pl}:{pc}>   : parameters of slackbot command
-
-        # check that the first token is '/slackbot' (slash, 'slackbot'), or the user argument begins_with
-        if parsed_input[0] == begins_with:
-
-            # following blocks: specific processing for each slackbot command
-
-            # specific processing for: create
-            COMMAND = 'create'
-            if parsed_input[1] == COMMAND:
-                param_list = parsed_input[2].split(':')
-                # length must be exactly 4, and all parameters must be correct
-                #   (TN task_name, TD task_description, PL priority_level, PC percent_completion)
-                # need to cast PL and PC as int (because they are strings)
-                # note: range (a,b) goes from a to b-1 : [a;b-1], or [a;b[ (if a and b are integers, and a<b)
-                if len(param_list) == 4:
-                    # basic parameter value checks
-                    if ( (len(param_list[0]) > 0) and (len(param_list[1]) > 0) and
-                         (int(param_list[2]) in priority_level_list) and (int(param_list[3]) in range(0,101)) ):
-                        ret_dict = {col_command:COMMAND,
-                                    col_taskname:param_list[0],
-                                    col_taskdesc:param_list[1],
-                                    col_priolevel:int(param_list[2]),
-                                    col_percent:int(param_list[3])}
-
-            # specific processing for: update
-            COMMAND = 'update'
-            if parsed_input[1] == COMMAND:
-                param_list = parsed_input[2].split(':')
-                # length must be exactly 4, but TD and PL can be empty
-                if len(param_list) == 4:
-                    # basic parameter value checks: only TN and PC; TD can be added even if empty, no need to check
-                    if (len(param_list[0]) > 0) and (int(param_list[3]) in range(0, 101)):
-                        # check for optional PL; but don't create return value if incorrect
-                        # (if PL is there, it has to be valid)
-                        if len(param_list[2])>0:
-                            if int(param_list[2]) in priority_level_list:
-                                ret_dict = {col_command: COMMAND,
-                                            col_taskname: param_list[0],
-                                            col_taskdesc: param_list[1],
-                                            col_priolevel: int(param_list[2]),
-                                            col_percent: int(param_list[3])}
-                            # else, do not return the dictionary: priority level was invalid
-                        else:
-                            ret_dict = {col_command: COMMAND,
-                                        col_taskname: param_list[0],
-                                        col_taskdesc: param_list[1],
-                                        col_priolevel: '',
-                                        col_percent: int(param_list[3])}
-
-            # specific processing for: suspend
-            COMMAND = 'suspend'
-            if parsed_input[1] == COMMAND:
-                param_list = parsed_input[2].split(':')
-                # length should be exactly 1
-                if len(param_list) == 1:
-                    # basic parameter value checks: only TN
-                    if len(param_list[0]) > 0:
-                        ret_dict = {col_command: COMMAND,
-                                    col_taskname: param_list[0],
-                                    col_taskdesc: '',
-                                    col_priolevel: '',
-                                    col_percent: ''}
-
-            # specific processing for: abandon
-            COMMAND = 'abandon'
-            if parsed_input[1] == COMMAND:
-                param_list = parsed_input[2].split(':')
-                # length should be exactly 1
-                if len(param_list) == 1:
-                    # basic parameter value checks: only TN
-                    if len(param_list[0]) > 0:
-                        ret_dict = {col_command: COMMAND,
-                                    col_taskname: param_list[0],
-                                    col_taskdesc: '',
-                                    col_priolevel: '',
-                                    col_percent: ''}
-
-        return ret_dict
-
-    except:
-        # no slackbot command match, so return variable is not modified, and is left empty
-        return ret_dict
+    parsed = slackbot_command_record(input_line_of_text, begins_with)
+    if parsed is None:
+        # no slackbot command match, so the returned data structure is left empty
+        return {}
+    # parsed records are shared: build a new dictionary, that the caller is free to modify
+    return parsed.as_dict()
 
 
 if __name__ == "__main__":
@@ -140,12 +263,14 @@ if __name__ == "__main__":
                        '/slackbot update myTaskC::0:30',
                        '/slackbot update myTaskC:::50',
                        '/slackbot update myTaskC:::40',
-                       '/slackbot abandon myTaskC'
+                       '/slackbot abandon myTaskC',
+                       '  /slackbot suspend myTaskD'
                       ]
 
-    print('Good test lines:')
+    # the output is built first, then written at once, so that the test loops mostly time the parser
+    out = ['Good test lines:']
     for test_line in good_test_lines:
-        print (test_line,':\n   ',slackbot_command_parse(test_line))
+        out.append(f'{test_line} :\n    {slackbot_command_parse(test_line)}')
 
 
     badd_test_lines = ['/slackbott create myTaskA:\'plain vanilla task\':1:10',
@@ -174,10 +299,18 @@ if __name__ == "__main__":
                        '/slackbot abandon myTaskC::3:',
                        '/slackbot abandon myTaskC:::102',
                        '/slackbot create myTaskA:\'plain vanilla task\":1:10',
-                       '/slackbot create myTaskA:\"plain vanilla task\':1:10'
+                       '/slackbot create myTaskA:\"plain vanilla task\':1:10',
+                       'just a regular chat message, not a command',
+                       '/slackbot\'\' suspend myTaskD',
+                       '\"/slackbot\" suspend myTaskD',
+                       '\u00a0/slackbot suspend myTaskD',
+                       '/slackbot suspend ' + 'x' * _MAX_LINE_LENGTH
                        ]
 
-    print()
-    print('Bad test lines:')
+    out.append('')
+    out.append('Bad test lines:')
     for test_line in badd_test_lines:
-        print(test_line, ':\n   ', slackbot_command_parse(test_line))
+        out.append(f'{test_line} :\n    {slackbot_command_parse(test_line)}')
+
+    out.append('')
+    sys.stdout.write('\n'.join(out))